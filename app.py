@@ -1,73 +1,322 @@
 import streamlit as st
-import pandas as pd
 import gspread
 import datetime
+import time
 import os
 import threading
+import sqlite3
+import re
+import uuid
 from google.oauth2.service_account import Credentials
 import json
+import logging
+
+try:
+    import orjson
+except ImportError:  # Optional speedup; fall back to the stdlib decoder
+    orjson = None
+
+logger = logging.getLogger(__name__)
+
+# --- FAST JSON DECODING ---
+class _OrjsonCompat:
+    """ Stand-in for requests' `complexjson`: orjson for plain loads, the stdlib json module for everything else. """
+
+    def __getattr__(self, name):
+        return getattr(json, name)
+
+    @staticmethod
+    def loads(s, **kwargs):
+        if kwargs:
+            return json.loads(s, **kwargs)
+        return orjson.loads(s)
+
+@st.cache_resource
+def use_orjson_for_requests():
+    """ Decode requests' JSON responses, which is how gspread reads Sheets, with orjson.
+
+    Only requests.models.complexjson is swapped; the process-wide json module (and Streamlit's own
+    use of it) is untouched. orjson differs from the stdlib in ways Sheets responses never hit:
+    integers beyond 64 bits come back as floats, and NaN/Infinity literals or a UTF-8 BOM raise.
+    Patched once per process; orjson.JSONDecodeError subclasses json.JSONDecodeError, so
+    requests' error handling is unchanged.
+    """
+    if orjson is None:
+        return False
+    import requests.models
+
+    requests.models.complexjson = _OrjsonCompat()
+    return True
+
+use_orjson_for_requests()
 
 # --- GOOGLE SHEETS SETUP ---
 GOOGLE_CREDENTIALS = st.secrets["GOOGLE_CREDENTIALS"]
 SHEET_ID = st.secrets["SHEET_ID"]
 
-# Authenticate Google Sheets
-creds = Credentials.from_service_account_info(GOOGLE_CREDENTIALS, scopes=["https://www.googleapis.com/auth/spreadsheets"])
-gc = gspread.authorize(creds)
+# Authenticate Google Sheets once per process, shared by every session
+@st.cache_resource
+def get_gspread_client():
+    """ Authorize the gspread client from the service account credentials. """
+    creds = Credentials.from_service_account_info(GOOGLE_CREDENTIALS, scopes=["https://www.googleapis.com/auth/spreadsheets"])
+    return gspread.authorize(creds)
+
+@st.cache_resource
+def _worksheet_handle_cache():
+    """ Worksheet handles, per-user locks and logged-out users shared by every session and the sync thread (script globals reset on each rerun). """
+    return {}, {}, set(), threading.Lock()
+
+# Per-user worksheet handles are reused across requests to skip lookup round-trips
+_WS_CACHE: dict[str, gspread.Worksheet]
+_WS_USER_LOCKS: dict[str, threading.Lock]
+_WS_LOGGED_OUT: set[str]  # Handles to drop once the user's final annotations are synced
+_WS_CACHE, _WS_USER_LOCKS, _WS_LOGGED_OUT, _WS_LOCK = _worksheet_handle_cache()
 
 # --- GOOGLE SHEETS FUNCTIONS ---
+@st.cache_resource
+def get_spreadsheet():
+    """ Open the connected spreadsheet once and reuse the handle. """
+    return get_gspread_client().open_by_key(SHEET_ID)
+
+@st.cache_data(ttl=300, show_spinner=False)
 def fetch_allowed_users():
-    """Fetch allowed users from the 'allowed_users' tab in the connected Google Sheet."""
-    spreadsheet = gc.open_by_key(SHEET_ID)
+    """Fetch allowed users from the 'allowed_users' tab in the connected Google Sheet.
+
+    Cached across all sessions for 5 minutes; call `fetch_allowed_users.clear()` to force a refresh.
+    """
+    spreadsheet = get_spreadsheet()
     worksheet = spreadsheet.worksheet("allowed_users_CE")  # Use the new tab name
     allowed_users = worksheet.col_values(1)  # Fetch usernames from Column A
-    return set(allowed_users)
+    return frozenset(allowed_users)
 
 def get_user_worksheet(user_id):
     """ Ensure each user has a personal worksheet. Create one if it doesn’t exist. """
-    spreadsheet = gc.open_by_key(SHEET_ID)
-    try:
-        return spreadsheet.worksheet(user_id)
-    except gspread.exceptions.WorksheetNotFound:
-        worksheet = spreadsheet.add_worksheet(title=user_id, rows="1000", cols="4")
-        worksheet.insert_row(["user_id", "sentence", "annotation", "time_of_annotation"], index=1)
+    worksheet = _WS_CACHE.get(user_id)
+    if worksheet is not None:
+        return worksheet
+
+    # _WS_LOCK only guards the dicts; the network calls hold just this user's lock
+    with _WS_LOCK:
+        user_lock = _WS_USER_LOCKS.setdefault(user_id, threading.Lock())
+
+    spreadsheet = get_spreadsheet()
+    with user_lock:
+        worksheet = _WS_CACHE.get(user_id)
+        if worksheet is None:
+            try:
+                worksheet = spreadsheet.worksheet(user_id)
+            except gspread.exceptions.WorksheetNotFound:
+                worksheet = spreadsheet.add_worksheet(title=user_id, rows="1000", cols="4")
+                worksheet.insert_row(["user_id", "sentence", "annotation", "time_of_annotation"], index=1)
+            with _WS_LOCK:
+                _WS_CACHE[user_id] = worksheet
         return worksheet
 
+def warm_user_worksheet(user_id):
+    """ Fetch the user's worksheet handle in the background so the first sync reuses it. """
+    try:
+        get_user_worksheet(user_id)
+    except Exception:
+        logger.exception("Could not prepare the worksheet for %s", user_id)  # The first sync looks it up again
+
+def forget_user_worksheet_after_sync(user_id):
+    """ On logout, keep the handle until the sync thread has flushed the user's last annotations. """
+    with _WS_LOCK:
+        _WS_LOGGED_OUT.add(user_id)
+
+def keep_user_worksheet(user_id):
+    """ Cancel a pending drop of the user's handle (they logged back in before the flush). """
+    with _WS_LOCK:
+        _WS_LOGGED_OUT.discard(user_id)
+
 def get_annotated_sentences(user_id):
-    """ Fetch already annotated sentences for the user. """
+    """ Fetch the sentences the user has already annotated, in sheet order. """
     worksheet = get_user_worksheet(user_id)
-    data = worksheet.get_all_values()
-    if len(data) > 1:
-        df_annotations = pd.DataFrame(data[1:], columns=["user_id", "sentence", "annotation", "time_of_annotation"])
-        return set(df_annotations["sentence"].tolist())
-    return set()
+    # Only the sentence column below the header. Kept formatted (the default), like the login batchGet:
+    # older USER_ENTERED rows such as "50%" are stored as numbers and only match the corpus as displayed text
+    columns = worksheet.get("B2:B", major_dimension="COLUMNS")
+    return columns[0] if columns else []
+
+@st.cache_data(ttl=60, show_spinner=False)
+def fetch_login_data(user_id):
+    """ Read the allow-list and the user's annotated sentences in a single batchGet round-trip.
+
+    Cached for a minute so quick re-logins skip Sheets; the sync thread clears it after each save.
+    Raises gspread.exceptions.APIError if the user has no worksheet yet.
+    """
+    spreadsheet = get_spreadsheet()
+    resp = spreadsheet.values_batch_get(ranges=["allowed_users_CE!A:A", f"'{user_id}'!B2:B"])
+    allowed, annotated = resp["valueRanges"]
+    allowed_users = frozenset(row[0] for row in allowed.get("values", []) if row)
+    return allowed_users, [row[0] if row else "" for row in annotated.get("values", [])]
+
+def is_missing_worksheet_error(error):
+    """ True if a batchGet failed only because a requested tab does not exist yet. """
+    return error.code == 400 and "Unable to parse range" in error.error.get("message", "")
 
 def save_annotations(user_id, annotations):
-    """ Save annotations asynchronously to Google Sheets. """
+    """ Save annotations to Google Sheets (called from the background sync thread). """
+    # Timestamps are stored as epoch seconds locally and only formatted here
+    rows = [
+        [row_user, sentence, label, datetime.datetime.fromtimestamp(ts).strftime("%Y-%m-%d %H:%M:%S")]
+        for row_user, sentence, label, ts in annotations
+    ]
     worksheet = get_user_worksheet(user_id)
-    worksheet.append_rows(annotations)
+    worksheet.append_rows(rows, value_input_option="RAW", insert_data_option="INSERT_ROWS")
+
+# --- LOCAL ANNOTATION STORE ---
+# Annotations land in SQLite right away and are synced to Google Sheets in the background
+ANNOTATIONS_DB = os.path.join(os.getcwd(), "annotations.db")
+SYNC_INTERVAL_SECONDS = 30
+CLAIM_TIMEOUT_SECONDS = 600  # Claims older than this are assumed abandoned by a dead sync thread
+
+def connect_annotation_store():
+    """ Open a connection to the local store in autocommit mode; transactions are explicit. """
+    return sqlite3.connect(ANNOTATIONS_DB, timeout=30, isolation_level=None, check_same_thread=False)
+
+def sync_pending_annotations(conn):
+    """ Push pending annotations to Google Sheets, deleting each user's rows once they are saved.
+
+    Rows are claimed inside SQLite before appending, so a second sync thread (e.g. after the
+    resource cache is cleared) can never append the same rows twice.
+    """
+    claim = uuid.uuid4().hex
+    now = time.time()
+    conn.execute("BEGIN IMMEDIATE")
+    try:
+        conn.execute(
+            "UPDATE pending SET claimed = ?, claimed_at = ? WHERE claimed IS NULL OR claimed_at < ?",
+            (claim, now, now - CLAIM_TIMEOUT_SECONDS),
+        )
+        pending = conn.execute(
+            "SELECT user_id, sentence, label, ts FROM pending WHERE claimed = ? ORDER BY id", (claim,)
+        ).fetchall()
+        conn.execute("COMMIT")
+    except Exception:
+        conn.execute("ROLLBACK")
+        raise
+
+    rows_by_user = {}
+    for user_id, sentence, label, ts in pending:
+        rows_by_user.setdefault(user_id, []).append([user_id, sentence, label, ts])
+
+    saved = []  # Users whose rows reached Sheets; their claims must never be released for another append
+    try:
+        for user_id, rows in rows_by_user.items():
+            try:
+                save_annotations(user_id, rows)
+                saved.append(user_id)
+                fetch_login_data.clear()  # Cleared before deleting, so logins never miss the saved rows
+                conn.execute("DELETE FROM pending WHERE claimed = ? AND user_id = ?", (claim, user_id))
+                fetch_login_data.clear()  # And after, in case a read that started before the append cached stale rows
+            except Exception:
+                logger.exception("Could not sync %d annotations for %s", len(rows), user_id)
+    finally:
+        # Hand unsaved rows back to the next pass instead of stranding them until the claim times out
+        placeholders = ", ".join("?" * len(saved))
+        conn.execute(
+            f"UPDATE pending SET claimed = NULL WHERE claimed = ? AND user_id NOT IN ({placeholders})",
+            (claim, *saved),
+        )
+        # Retry deletes that failed after a successful append (a no-op for rows already deleted)
+        for user_id in saved:
+            conn.execute("DELETE FROM pending WHERE claimed = ? AND user_id = ?", (claim, user_id))
+        fetch_login_data.clear()
+
+def forget_synced_worksheets(conn):
+    """ Drop handles of logged-out users whose pending annotations have all reached Google Sheets. """
+    with _WS_LOCK:
+        logged_out = list(_WS_LOGGED_OUT)
+    for user_id in logged_out:
+        if conn.execute("SELECT 1 FROM pending WHERE user_id = ? LIMIT 1", (user_id,)).fetchone() is None:
+            with _WS_LOCK:
+                if user_id in _WS_LOGGED_OUT:
+                    _WS_LOGGED_OUT.discard(user_id)
+                    _WS_CACHE.pop(user_id, None)
+
+@st.cache_resource
+def start_annotation_sync():
+    """ Open the local annotation store and start the thread that syncs it to Google Sheets. """
+    conn = connect_annotation_store()
+    conn.execute(
+        "CREATE TABLE IF NOT EXISTS pending ("
+        "id INTEGER PRIMARY KEY AUTOINCREMENT, user_id TEXT, sentence TEXT, label TEXT, ts REAL, "
+        "claimed TEXT, claimed_at REAL)"
+    )
+    lock = threading.Lock()
+    wake = threading.Event()
+
+    def sync():
+        sync_conn = connect_annotation_store()  # Own connection, so its transactions never mix with sessions'
+        while True:
+            # The first pass flushes rows left over from a previous run
+            try:
+                sync_pending_annotations(sync_conn)
+                forget_synced_worksheets(sync_conn)
+            except Exception:
+                # Keep the thread alive: st.cache_resource will not start another one
+                logger.exception("Annotation sync failed; retrying in %d seconds", SYNC_INTERVAL_SECONDS)
+            wake.wait(SYNC_INTERVAL_SECONDS)
+            wake.clear()
+
+    threading.Thread(target=sync, daemon=True).start()
+    return conn, lock, wake
+
+# Shared by every session; st.cache_resource keeps a single sync thread alive across reruns
+_DB, _DB_LOCK, _SYNC_WAKE = start_annotation_sync()
+
+def store_annotation(user_id, sentence, label):
+    """ Record an annotation locally; the sync thread pushes it to Google Sheets. """
+    with _DB_LOCK:
+        _DB.execute(
+            "INSERT INTO pending(user_id, sentence, label, ts) VALUES (?, ?, ?, ?)",
+            (user_id, sentence, label, time.time()),
+        )
+
+def get_pending_sentences(user_id):
+    """ Sentences the user has annotated that are not in Google Sheets yet, including rows being synced right now.
+
+    Login merges these with the sheet's rows, so a quick re-login never re-serves them.
+    """
+    with _DB_LOCK:
+        return [row[0] for row in _DB.execute("SELECT sentence FROM pending WHERE user_id = ?", (user_id,))]
 
 # --- STREAMLIT APP SETUP ---
 st.sidebar.title("Brugerlogin")
 
-# ✅ Load allowed users dynamically from Google Sheets
-# ALLOWED_USERS = fetch_allowed_users()
-
-# ✅ Load allowed users only once per session
-if "ALLOWED_USERS" not in st.session_state:
-    st.session_state.ALLOWED_USERS = fetch_allowed_users()
-
 # ✅ Check if user is logged in
 if "user_id" not in st.session_state:
     user_id = st.sidebar.text_input("Indtast dit bruger-ID:")
+
+    # ✅ Allowed users are cached globally; let newly added users force a refresh
+    if st.sidebar.button("Opdater brugere", key="refresh_users_btn"):
+        fetch_allowed_users.clear()
+        fetch_login_data.clear()
+
     if st.sidebar.button("Log in") and user_id.strip():
-        #if user_id.strip() in ALLOWED_USERS:
-        if user_id.strip() in st.session_state.ALLOWED_USERS:
-            st.session_state.user_id = user_id.strip()
-            st.session_state.sentence_index = -1
-            st.session_state.annotations = []
-            st.session_state.annotated_sentences = get_annotated_sentences(user_id)
-            st.session_state.worksheet_ready = False
+        user_id = user_id.strip()
+        try:
+            allowed_users, annotated = fetch_login_data(user_id)
+        except gspread.exceptions.APIError as e:
+            if not is_missing_worksheet_error(e):
+                # Quota, server or auth errors: don't pile more requests onto Sheets
+                st.sidebar.error("❌ Google Sheets kunne ikke nås. Prøv igen om lidt.")
+                st.stop()
+            # No worksheet for this user yet: check the cached allow-list, then create it below
+            allowed_users, annotated = fetch_allowed_users(), None
+
+        if user_id in allowed_users:
+            if annotated is None:
+                annotated = get_annotated_sentences(user_id)  # Also creates and caches the worksheet
+            else:
+                # ✅ The batchGet never touches the worksheet handle; warm it without blocking the UI
+                threading.Thread(target=warm_user_worksheet, args=(user_id,), daemon=True).start()
+            annotated = annotated + get_pending_sentences(user_id)  # ✅ Include rows not yet synced
+            keep_user_worksheet(user_id)
+            st.session_state.user_id = user_id
+            # ✅ Count distinct sentences: rows just synced can appear both in the sheet and in pending
+            st.session_state.annotated_count = len(set(annotated))
+            st.session_state.annotated_sentences = annotated  # ✅ Turned into the `done` bitmap once sentences are loaded
             st.session_state.finished = False
             st.session_state.selected_label = None  # ✅ Track selected button label
             st.rerun()
@@ -78,9 +327,8 @@ else:
     st.sidebar.success(f"✅ Du er logget ind som: **{user_id}**")
 
     if st.sidebar.button("Log ud"):
-        if st.session_state.annotations:
-            threading.Thread(target=save_annotations, args=(user_id, st.session_state.annotations), daemon=True).start()
-            st.session_state.annotations = []
+        forget_user_worksheet_after_sync(user_id)  # The sync thread still needs the handle for the final flush
+        _SYNC_WAKE.set()  # Sync this user's pending annotations now instead of at the next interval
         st.session_state.clear()
         st.rerun()
 
@@ -89,11 +337,6 @@ if "user_id" not in st.session_state:
     st.warning("Indtast dit bruger-ID ude til venstre for at begynde at annotere.")
     st.stop()
 
-# ✅ Ensure each user has their personal worksheet (but do not block UI)
-if not st.session_state.get("worksheet_ready", False):
-    threading.Thread(target=get_user_worksheet, args=(user_id,), daemon=True).start()
-    st.session_state.worksheet_ready = True
-
 # --- LOAD SENTENCES FROM LOCAL FILE ---
 BASE_DIR = os.getcwd()
 DATA_FILE = os.path.join(BASE_DIR, "data", "clean", "processed_sentences.txt")
@@ -102,134 +345,111 @@ if not os.path.exists(DATA_FILE):
     st.error("Processed sentence file missing! Run `preprocess.py` first.")
     st.stop()
 
-with open(DATA_FILE, "r", encoding="utf-8") as file:
-    sentences = [line.strip() for line in file if line.strip()]
-
-df_sentences = pd.DataFrame(sentences, columns=["sentence"])
-
-# ✅ Remove already annotated sentences from the dataset
-unannotated_sentences = df_sentences[~df_sentences["sentence"].isin(st.session_state.annotated_sentences)]["sentence"].tolist()
-
-# ✅ Store unannotated sentences in session state
-st.session_state.unannotated_sentences = unannotated_sentences
+@st.cache_data
+def load_sentences(path):
+    """ Read the sentence file once per process; a tuple keeps the cached value immutable. """
+    with open(path, "r", encoding="utf-8") as file:
+        return tuple(line.strip() for line in file if line.strip())
+
+sentences = load_sentences(DATA_FILE)
+
+def next_unannotated(start):
+    """ Index of the first sentence at or after `start` that is not yet annotated (len(sentences) if none). """
+    index = st.session_state.done.find(0, start)
+    return len(sentences) if index == -1 else index
+
+# ✅ Track annotation state as one byte per sentence instead of a set of sentence strings
+if "done" not in st.session_state:
+    idx_of = {s: i for i, s in enumerate(sentences)}
+    done = bytearray(len(sentences))
+    for s in st.session_state.pop("annotated_sentences"):
+        i = idx_of.get(s)
+        if i is not None:
+            done[i] = 1
+    st.session_state.done = done
+    st.session_state.sentence_index = next_unannotated(0)
 
 # Initialize progress and ticket tracking
 if "total_sentences" not in st.session_state:
-    st.session_state.total_sentences = len(st.session_state.unannotated_sentences)
-
-if "annotated_count" not in st.session_state:
-    st.session_state.annotated_count = len(st.session_state.annotated_sentences)
+    st.session_state.total_sentences = len(sentences)
 
 if "lottery_tickets" not in st.session_state:
     st.session_state.lottery_tickets = st.session_state.annotated_count // 30
 
-# ✅ Ensure `sentence_index` is initialized correctly
-if "sentence_index" not in st.session_state or st.session_state.sentence_index == -1:
-    st.session_state.sentence_index = 0
-    #st.rerun()
-
 # ✅ If all sentences are annotated, trigger completion message immediately
-if len(st.session_state.unannotated_sentences) == 0 or st.session_state.get("finished", False):
+if st.session_state.sentence_index >= len(sentences) or st.session_state.get("finished", False):
     st.session_state.finished = True
     st.success("🎉 Du har annoteret alle sætninger!")
     st.info("✅ Du kan nu logge ud via knappen i sidebaren.")
     
-    # ✅ Save any remaining annotations on completion
-    if st.session_state.annotations:
-        threading.Thread(target=save_annotations, args=(user_id, st.session_state.annotations), daemon=True).start()
-        st.session_state.annotations = []
+    # ✅ Sync any remaining annotations on completion
+    _SYNC_WAKE.set()
 
     st.stop()
 
-# ✅ Get the next sentence properly
-sentence = st.session_state.unannotated_sentences[st.session_state.sentence_index]
-
 # --- SENTENCE DISPLAY (Styled Like Screenshot) ---
-# --- Detect Dark Mode ---
-is_dark_mode = st.get_option("theme.base") == "dark"
-
-# Set colors dynamically
-bg_color = "#f9f9f9" if not is_dark_mode else "#262730"  # Light gray for light mode, dark gray for dark mode
-text_color = "#000000" if not is_dark_mode else "#ffffff"  # Black for light mode, white for dark mode
-
-# --- Progress Bar ---
-progress = st.session_state.annotated_count / st.session_state.total_sentences
-st.progress(progress)
+# --- Detect Dark Mode (once per session) ---
+if "bg_color" not in st.session_state:
+    is_dark_mode = st.get_option("theme.base") == "dark"
 
-# --- Lottery Ticket Counter ---
-st.info(f"🎟️ Lodsedler: {st.session_state.lottery_tickets} (Optjen en ny lodseddel for hver 30. annoterede sætning)")
+    # Set colors dynamically
+    st.session_state.bg_color = "#f9f9f9" if not is_dark_mode else "#262730"  # Light gray for light mode, dark gray for dark mode
+    st.session_state.text_color = "#000000" if not is_dark_mode else "#ffffff"  # Black for light mode, white for dark mode
 
-# --- SENTENCE DISPLAY (Styled for Both Modes) ---
+# Styles the keyed sentence container below; the CSS only changes if the theme colors do
+sentence_card_style = """
+    <style>
+    .st-key-sentence_card {{
+        border: 2px solid #ccc;
+        padding: 10px;
+        margin: 15px 0;
+        background-color: {bg_color};
+    }}
+    .st-key-sentence_card p {{
+        font-size: 18px;
+        font-weight: bold;
+        color: {text_color};
+    }}
+    </style>
+"""
 st.markdown(
-    f"""
-    <div style="border:2px solid #ccc; padding:15px; margin:15px 0; background-color:{bg_color}; 
-                font-size:18px; font-weight:bold; color:{text_color}; padding:10px;">
-        {sentence}
-    </div>
-    """,
+    sentence_card_style.format(bg_color=st.session_state.bg_color, text_color=st.session_state.text_color),
     unsafe_allow_html=True,
 )
 
-# --- More Context Button ---
-st.button("Mere kontekst", key="context_btn")
-
-# --- Question Text ---
-st.markdown("**Vil den brede offentlighed være interesseret i at vide, om (dele af) denne sætning er sand eller falsk?**")
-
 # --- FUNCTION TO HANDLE ANNOTATION ---
+# Used as button on_click callbacks, which run before the fragment re-executes, so no st.rerun() is needed
 def annotate(label):
    
     # Get the current sentence
-    sentence = st.session_state.unannotated_sentences[st.session_state.sentence_index]
+    sentence = sentences[st.session_state.sentence_index]
 
-    # Store annotation in session state
-    new_entry = [user_id, sentence, label, datetime.datetime.now().strftime("%Y-%m-%d %H:%M:%S")]
-    st.session_state.annotations.append(new_entry)
+    # Store annotation in the local store
+    store_annotation(user_id, sentence, label)
 
     # Update progress for user
+    st.session_state.done[st.session_state.sentence_index] = 1
     st.session_state.annotated_count += 1
 
     # Aware lottery ticket for every 30 annotations
     if st.session_state.annotated_count % 30 == 0:
         st.session_state.lottery_tickets += 1
-        st.success(f"🎉 Du har optjent en ekstra lodseddel! Antal lodsedler: {st.session_state.lottery_tickets}")
+        st.toast(f"🎟️ Ny lodseddel! Total: {st.session_state.lottery_tickets}")  # Toasts survive the rerun
 
     # ✅ Move to next sentence or show completion message
-    if st.session_state.sentence_index >= len(st.session_state.unannotated_sentences) - 1:
+    next_index = next_unannotated(st.session_state.sentence_index + 1)
+    if next_index >= len(sentences):
         st.session_state.finished = True
-        threading.Thread(target=save_annotations, args=(user_id, st.session_state.annotations), daemon=True).start()
-        st.session_state.annotations = []
-        st.rerun()
     else:
-        st.session_state.sentence_index += 1
-        if len(st.session_state.annotations) >= 10:
-            threading.Thread(target=save_annotations, args=(user_id, st.session_state.annotations), daemon=True).start()
-            st.session_state.annotations = []
-        st.rerun()
+        st.session_state.sentence_index = next_index
 
 def skip_sentence():
     """ Move to the next sentence without annotation. """
-    if st.session_state.sentence_index < len(st.session_state.unannotated_sentences) - 1:
-        st.session_state.sentence_index += 1
-        st.rerun()
+    next_index = next_unannotated(st.session_state.sentence_index + 1)
+    if next_index < len(sentences):
+        st.session_state.sentence_index = next_index
     else:
         st.session_state.finished = True
-        st.success("🎉 Du har annoteret alle sætninger!")
-        st.info("✅ Du kan nu logge ud via knappen i sidebaren.")
-        st.stop()
-        
-# --- ANNOTATION BUTTONS ---
-if st.button("Der er **ikke** en faktuel påstand.", key=f"label_btn_{st.session_state.sentence_index}_1"):
-    annotate("No factual claim")
-
-if st.button("Der er en faktuel påstand, men den er **ikke vigtig**.", key=f"label_btn_{st.session_state.sentence_index}_2"):
-    annotate("Factual but unimportant")
-
-if st.button("Der er en **vigtig** faktuel påstand.", key=f"label_btn_{st.session_state.sentence_index}_3"):
-    annotate("Important factual claim")
-
-if st.button("Det er en **normativ** udtalelse (værdi-udtalelse, ønske eller anbefaling)", key=f"label_btn_{st.session_state.sentence_index}_4"):
-    annotate("Normative statement")
 
 ## Labels
 # No factual claim – No verifiable information.
@@ -237,25 +457,69 @@ if st.button("Det er en **normativ** udtalelse (værdi-udtalelse, ønske eller a
 # Important factual claim – Verifiable and relevant.
 # Normative statement – Expresses value judgments, recommendations, or policies.
 # Maybe also: Mixed claim – Contains both factual and normative elements (optional but useful for edge cases).
+LABELS = [
+    ("No factual claim", "Der er **ikke** en faktuel påstand."),
+    ("Factual but unimportant", "Der er en faktuel påstand, men den er **ikke vigtig**."),
+    ("Important factual claim", "Der er en **vigtig** faktuel påstand."),
+    ("Normative statement", "Det er en **normativ** udtalelse (værdi-udtalelse, ønske eller anbefaling)"),
+]
+
+def escape_markdown(text):
+    """ Backslash-escape all ASCII punctuation so corpus text renders literally (no Markdown or LaTeX). """
+    return re.sub(r"([!-/:-@\[-`{-~])", r"\\\1", text)
+
+# --- ANNOTATION PANEL ---
+# Only this fragment re-executes on a click; file loading, login and setup above run on full reruns
+@st.fragment
+def annotation_panel():
+    # ✅ Full rerun so the completion message replaces the panel
+    if st.session_state.finished:
+        st.rerun()
 
-# --- SEPARATOR LINE ---
-st.markdown("---")  # Adds a horizontal line separator
-        
-# --- SKIP BUTTON (Styled with Smaller Font) ---
-skip_button_style = """
-    <style>
-    .small-font-button > button {
-        font-size: 12px !important;
-        padding: 4px 10px !important;
-    }
-    </style>
-"""
-st.markdown(skip_button_style, unsafe_allow_html=True)
+    # ✅ Get the next sentence properly
+    sentence = sentences[st.session_state.sentence_index]
+
+    # --- Progress Bar ---
+    progress = min(st.session_state.annotated_count / st.session_state.total_sentences, 1.0)
+    st.progress(progress)
+
+    # --- Lottery Ticket Counter ---
+    st.info(f"🎟️ Lodsedler: {st.session_state.lottery_tickets} (Optjen en ny lodseddel for hver 30. annoterede sætning)")
+
+    # --- SENTENCE DISPLAY (Styled for Both Modes) ---
+    with st.container(key="sentence_card"):
+        st.markdown(escape_markdown(sentence))
+
+    # --- More Context Button ---
+    st.button("Mere kontekst", key="context_btn")
+
+    # --- Question Text ---
+    st.markdown("**Vil den brede offentlighed være interesseret i at vide, om (dele af) denne sætning er sand eller falsk?**")
+
+    # --- ANNOTATION BUTTONS (stable keys, so Streamlit updates them in place between sentences) ---
+    cols = st.columns(len(LABELS))
+    for i, (col, (label, text)) in enumerate(zip(cols, LABELS), start=1):
+        col.button(text, key=f"label_btn_{i}", on_click=annotate, args=(label,))
+
+    # --- SEPARATOR LINE ---
+    st.markdown("---")  # Adds a horizontal line separator
+
+    # --- SKIP BUTTON (Styled with Smaller Font) ---
+    skip_button_style = """
+        <style>
+        .small-font-button > button {
+            font-size: 12px !important;
+            padding: 4px 10px !important;
+        }
+        </style>
+    """
+    st.markdown(skip_button_style, unsafe_allow_html=True)
+
+    # Place the button with custom styling
+    with st.container():
+        st.button("Spring denne sætning over", key="skip_btn", on_click=skip_sentence)
 
-# Place the button with custom styling
-with st.container():
-    if st.button("Spring denne sætning over", key=f"skip_{st.session_state.sentence_index}"):
-        skip_sentence()
+annotation_panel()
         
 
 # def go_back():